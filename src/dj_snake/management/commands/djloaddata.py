@@ -1,51 +1,237 @@
+import io
+import json
 import os
 import warnings
-from collections import defaultdict
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import groupby, islice
+from operator import attrgetter
 
+from django.apps import apps
 from django.core import serializers
+from django.core.serializers.base import DeserializationError
 from django.core.management.base import CommandError, CommandParser
 from django.core.management.commands import loaddata
 from django.core.management.utils import parse_apps_and_model_labels
 from django.db import (
     DatabaseError, IntegrityError, connections, models, router, transaction
 )
+from django.db.models.signals import post_save, pre_save
 
+# Maximum number of rows inserted by a single bulk INSERT query
+BULK_CREATE_BATCH_SIZE = 1000
 
-def group_objects_by_model(objects):
-    """Group list of deserialized objects by object's model class"""
-    grouped = defaultdict(list)
-    for obj in objects:
-        grouped[obj.object._meta.model].append(obj)
-    return grouped
 
+def count_objects_by_model(objects):
+    """Count deserialized objects by object's model class"""
+    return Counter(obj.object._meta.model for obj in objects)
 
-def topological_sort(dependency_graph):
+
+def count_records_by_model(records, ignorenonexistent=False):
     """
-    Takes a dependency graph as a dictionary of node => dependencies.
-    Yields node in topological order.
+    Count serialized records, i.e. dicts with a "model" key, by model class
+    without building model instances.
     """
-    todo = dependency_graph.copy()
-    while todo:
-        current = {node for node, deps in todo.items() if not deps}
+    counts = Counter()
+    for label, count in Counter(record["model"] for record in records).items():
+        try:
+            model = apps.get_model(label)
+        except (LookupError, TypeError):
+            if ignorenonexistent:
+                continue
+            raise DeserializationError("Invalid model identifier: '%s'" % label)
+        counts[model] += count
+    return counts
+
+
+def load_json_records(stream):
+    return json.load(stream)
+
+
+def load_jsonl_records(stream):
+    return (json.loads(line) for line in stream if line.strip())
+
+
+def load_yaml_records(stream):
+    import yaml
+    from django.core.serializers.pyyaml import SafeLoader
+
+    return yaml.load(stream, Loader=SafeLoader)
+
 
-        if not current:
-            raise ValueError(f"Cyclic dependency in graph: {todo}")
+# deserializer module => function loading the records of a fixture stream
+RECORD_LOADERS = {
+    "django.core.serializers.json": load_json_records,
+    "django.core.serializers.jsonl": load_jsonl_records,
+    "django.core.serializers.pyyaml": load_yaml_records,
+}
 
-        yield from current
 
-        # remove current from todo's nodes & dependencies
-        todo = {
-            node: (dependencies - current)
-            for node, dependencies in todo.items()
-            if node not in current
-        }
+def topological_waves(dependency_graph):
+    """
+    Takes a dependency graph as a dictionary of node => dependencies.
+    Yields lists of nodes in topological order, where nodes of the same list
+    don't depend on each other.
+    """
+    if not any(dependency_graph.values()):
+        # no dependencies at all, e.g. a fixture of a single model
+        if dependency_graph:
+            yield list(dependency_graph)
+        return
+
+    # number of dependencies not yielded yet of each node
+    in_degree = {node: len(deps) for node, deps in dependency_graph.items()}
+    # node => nodes depending on it
+    dependents = defaultdict(list)
+    for node, dependencies in dependency_graph.items():
+        for dependency in dependencies:
+            dependents[dependency].append(node)
+
+    wave = [node for node, degree in in_degree.items() if not degree]
+    while wave:
+        yield wave
+        next_wave = []
+        for node in wave:
+            for dependent in dependents[node]:
+                in_degree[dependent] -= 1
+                if not in_degree[dependent]:
+                    next_wave.append(dependent)
+        wave = next_wave
+
+    cyclic = {node for node, degree in in_degree.items() if degree}
+    if cyclic:
+        raise ValueError(
+            "Cyclic dependency in graph: %s"
+            % {node: dependency_graph[node] for node in cyclic}
+        )
+
+
+def topological_sort(dependency_graph):
+    """
+    Takes a dependency graph as a dictionary of node => dependencies.
+    Yields node in topological order.
+    """
+    for wave in topological_waves(dependency_graph):
+        yield from wave
 
 
+@lru_cache(maxsize=None)
 def get_related_fields(model):
     """Get OneToMany relations of given model"""
-    return [
+    return tuple(
         field for field in model._meta.fields if isinstance(field, models.ForeignKey)
+    )
+
+
+@lru_cache(maxsize=None)
+def split_related_fields(model):
+    """Split OneToMany relations of given model into non-nullable and nullable"""
+    related_fields = get_related_fields(model)
+    return (
+        tuple(field for field in related_fields if not field.null),
+        tuple(field for field in related_fields if field.null),
+    )
+
+
+@lru_cache(maxsize=None)
+def make_fk_rewriter_factory(model):
+    """
+    Generate the code of a function clearing the primary key and rewriting the
+    non-nullable foreign keys of a list of instances of the given model. Field
+    values are read and written straight from the instances' __dict__, skipping
+    the field descriptors, with the attnames inlined.
+
+    Return a factory taking one old => new primary key lookup function per
+    non-nullable related field and returning the rewriter.
+    """
+    opts = model._meta
+    related_fields = split_related_fields(model)[0]
+    lookups = ["lookup_%d" % i for i in range(len(related_fields))]
+    lines = [
+        "def factory(%s):" % ", ".join(lookups),
+        "    def rewrite(instances):",
+        "        for instance in instances:",
+        "            values = instance.__dict__",
     ]
+    if opts.parents:
+        # setting pk also clears the parent links
+        lines.append("            instance.pk = None")
+    else:
+        lines.append("            values[%r] = None" % opts.pk.attname)
+    lines.extend(
+        "            values[%(attname)r] = %(lookup)s(values[%(attname)r])"
+        % {"attname": field.attname, "lookup": lookup}
+        for field, lookup in zip(related_fields, lookups)
+    )
+    lines.append("    return rewrite")
+    namespace = {}
+    exec(
+        compile("\n".join(lines), "<fk rewriter for %s>" % opts.label, "exec"),
+        namespace,
+    )
+    return namespace["factory"]
+
+
+def to_copy_value(value):
+    """Format a database value as a field of a CSV row for COPY FROM STDIN"""
+    if value is None:
+        return ""  # unquoted empty field is NULL
+    if hasattr(value, "adapted"):
+        # psycopg2's Json adapter, dumps uses the field's encoder
+        value = value.dumps(value.adapted)
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, (bytes, memoryview)):
+        value = "\\x" + bytes(value).hex()
+    elif isinstance(value, (list, tuple)):
+        value = to_array_literal(value)
+    else:
+        value = str(value)
+    return '"%s"' % value.replace('"', '""')
+
+
+def to_array_literal(values):
+    """Format a list as a PostgreSQL array literal"""
+    items = []
+    for item in values:
+        if item is None:
+            items.append("NULL")
+        elif isinstance(item, (list, tuple)):
+            items.append(to_array_literal(item))
+        else:
+            if isinstance(item, bool):
+                item = "t" if item else "f"
+            item = str(item).replace("\\", "\\\\").replace('"', '\\"')
+            items.append('"%s"' % item)
+    return "{%s}" % ",".join(items)
+
+
+@lru_cache(maxsize=None)
+def bulk_create_keeps_values(model):
+    """
+    Whether bulk_create inserts the field values of the model's instances as
+    they are. Unlike a raw save, bulk_create calls Field.pre_save, which some
+    fields override to set their own value, e.g. auto_now DateTimeFields.
+    """
+    date_pre_saves = (
+        models.DateField.pre_save,
+        models.DateTimeField.pre_save,
+        models.TimeField.pre_save,
+    )
+    for field in model._meta.concrete_fields:
+        field_pre_save = type(field).pre_save
+        if field_pre_save in date_pre_saves:
+            if field.auto_now or field.auto_now_add:
+                return False
+        elif field_pre_save is not models.Field.pre_save:
+            return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def get_dependencies(model):
+    """Get the models referenced by non-nullable relations of given model"""
+    return frozenset(field.related_model for field in split_related_fields(model)[0])
 
 
 def build_model_dependecy_graph(model_classes):
@@ -53,20 +239,10 @@ def build_model_dependecy_graph(model_classes):
     Build a dependency graph of models by inspecting model's field references
     with other models
     """
-
-    def _get_dependencies(model):
-        return {
-            field.related_model for field in get_related_fields(model) if not field.null
-        }
-
-    graph = {}
-
-    for model in model_classes:
-        dependencies = _get_dependencies(model)
-        graph[model] = dependencies
-        # make sure all of our dependencies are included in the graph
-        for dependency in dependencies:
-            graph.setdefault(dependency, set())
+    graph = {model: get_dependencies(model) for model in model_classes}
+    # make sure all of our dependencies are included in the graph
+    for dependency in set().union(*graph.values()) - graph.keys():
+        graph[dependency] = frozenset()
     return graph
 
 
@@ -85,20 +261,56 @@ class Command(loaddata.Command):
             dest="ignore_conflicting",
             help="Ignore rows that fails with IntegrityError.",
         )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            dest="use_copy",
+            help="Insert rows with COPY FROM STDIN (PostgreSQL only).",
+        )
+        parser.add_argument(
+            "--unindex",
+            action="store_true",
+            help=(
+                "Drop non-unique indexes of the loaded tables during the load and "
+                "recreate them afterwards (PostgreSQL and SQLite only)."
+            ),
+        )
+        parser.add_argument(
+            "--assume-sorted",
+            action="store_true",
+            help=(
+                "Assume the objects of each model are contiguous in the fixture "
+                "and every model comes after the models its non-nullable foreign "
+                "keys reference, and load them in a single pass."
+            ),
+        )
 
     def handle(self, *fixture_labels, **options):
         self.ignore = options["ignore"]
         self.using = options["database"]
         self.app_label = options["app_label"]
         self.verbosity = options["verbosity"]
-        self.excluded_models, self.excluded_apps = parse_apps_and_model_labels(
-            options["exclude"]
-        )
+        excluded_models, excluded_apps = parse_apps_and_model_labels(options["exclude"])
+        self.excluded_models = frozenset(excluded_models)
+        self.excluded_apps = frozenset(excluded_apps)
         self.format = options["format"]
         self.ignore_conflicting = options["ignore_conflicting"]
+        self.use_copy = options["use_copy"]
+        if self.use_copy and connections[self.using].vendor != "postgresql":
+            raise CommandError("--copy is only supported on PostgreSQL.")
+        self.unindex = options["unindex"]
+        self.assume_sorted = options["assume_sorted"]
+        if self.unindex and connections[self.using].vendor not in (
+            "postgresql",
+            "sqlite",
+        ):
+            raise CommandError("--unindex is only supported on PostgreSQL and SQLite.")
+        # table => list of (index name, index definition)
+        self.dropped_indexes = {}
 
         with transaction.atomic(using=self.using):
             self.loaddata(fixture_labels)
+            self.recreate_indexes()
 
         # Close the DB connection -- unless we're still in a transaction. This
         # is required as a workaround for an edge case in MySQL: if the same
@@ -110,82 +322,73 @@ class Command(loaddata.Command):
     def load_label(self, fixture_label: str) -> None:
         """Load fixtures files for a given label."""
         self.old_new_primary_key_map = defaultdict(dict)
-        self.obj_with_nullable_fk = set()
 
-        show_progress = self.verbosity >= 3
+        connection = connections[self.using]
+        if connection.vendor == "postgresql":
+            # check foreign keys only on commit so that rows can reference
+            # rows inserted later in the same transaction
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+
+        self.show_progress = self.verbosity >= 3
         for fixture_file, fixture_dir, fixture_name in self.find_fixtures(
             fixture_label
         ):
             _, ser_fmt, cmp_fmt = self.parse_name(os.path.basename(fixture_file))
-            open_method, mode = self.compression_formats[cmp_fmt]
-            fixture = open_method(fixture_file, mode)
             try:
                 self.fixture_count += 1
                 objects_in_fixture = 0
-                loaded_objects_in_fixture = 0
+                self.loaded_objects_in_fixture = 0
                 if self.verbosity >= 2:
                     self.stdout.write(
                         "Installing %s fixture '%s' from %s."
                         % (ser_fmt, fixture_name, loaddata.humanize(fixture_dir))
                     )
 
-                objects = serializers.deserialize(
-                    ser_fmt,
-                    fixture,
-                    using=self.using,
-                    ignorenonexistent=self.ignore,
-                    handle_forward_references=True,
-                )
+                self.inserted_models = set()
+                # object => nullable fields referencing objects not inserted yet
+                self.obj_with_nullable_fk = defaultdict(list)
+
+                content = None
+                if cmp_fmt == "stdin" and not self.assume_sorted:
+                    content = self.read_stdin_fixture(fixture_file, cmp_fmt)
 
-                model_to_object_mapping = group_objects_by_model(objects)
-                graph = build_model_dependecy_graph(model_to_object_mapping.keys())
-
-                for model in topological_sort(graph):
-                    if model not in model_to_object_mapping:
-                        continue
-                    related_fields = get_related_fields(model)
-                    for obj in model_to_object_mapping[model]:
-                        objects_in_fixture += 1
-                        if self.save_obj(obj, model, related_fields):
-                            loaded_objects_in_fixture += 1
-                            if show_progress:
-                                self.stdout.write(
-                                    "\rProcessed %i object(s)."
-                                    % loaded_objects_in_fixture,
-                                    ending="",
-                                )
-
-                for obj in self.obj_with_nullable_fk:
-                    model = obj.object._meta.model
-                    nullable_related_fields = [
-                        field for field in get_related_fields(model) if field.null
+                if self.assume_sorted:
+                    objects_in_fixture += self.load_sorted_objects(
+                        self.deserialize_fixture(fixture_file, ser_fmt, cmp_fmt)
+                    )
+                else:
+                    # First pass: find out the models in the fixture and their
+                    # order without keeping the deserialized objects in memory.
+                    remaining = self.count_fixture_objects(
+                        fixture_file, ser_fmt, cmp_fmt, content
+                    )
+                    graph = build_model_dependecy_graph(remaining.keys())
+                    excluded = {model for model in remaining if self.is_excluded(model)}
+                    model_order = [
+                        model
+                        for model in topological_sort(graph)
+                        if model in remaining and model not in excluded
                     ]
-                    for field in nullable_related_fields:
-
-                        field_old_pk = getattr(obj.object, field.attname)
-                        field_new_pk = self.old_new_primary_key_map[
-                            field.related_model
-                        ].get(field_old_pk)
-
-                        setattr(obj.object, field.attname, field_new_pk)
-                        try:
-                            obj.save(using=self.using)
-                        # psycopg2 raises ValueError if data contains NULL chars.
-                        except (DatabaseError, IntegrityError, ValueError) as e:
-                            e.args = (
-                                "Could not load %(app_label)s.%(object_name)s(pk=%(pk)s): %(error_msg)s"
-                                % {
-                                    "app_label": obj.object._meta.app_label,
-                                    "object_name": obj.object._meta.object_name,
-                                    "pk": obj.object.pk,
-                                    "error_msg": e,
-                                },
-                            )
-                            raise
 
-                if objects and show_progress:
+                    if self.unindex:
+                        self.drop_indexes(model_order)
+
+                    # Second pass: insert the objects
+                    objects_in_fixture += self.load_objects(
+                        self.deserialize_fixture(
+                            fixture_file, ser_fmt, cmp_fmt, content
+                        ),
+                        model_order,
+                        remaining,
+                        excluded,
+                    )
+
+                self.update_nullable_fks()
+
+                if objects_in_fixture and self.show_progress:
                     self.stdout.write("")  # add a newline after progress indicator
-                self.loaded_object_count += loaded_objects_in_fixture
+                self.loaded_object_count += self.loaded_objects_in_fixture
                 self.fixture_object_count += objects_in_fixture
             except Exception as e:
                 if not isinstance(e, CommandError):
@@ -193,8 +396,6 @@ class Command(loaddata.Command):
                         "Problem installing fixture '%s': %s" % (fixture_file, e),
                     )
                 raise
-            finally:
-                fixture.close()
 
             # Warn if the fixture we loaded contains 0 objects.
             if objects_in_fixture == 0:
@@ -204,56 +405,458 @@ class Command(loaddata.Command):
                     RuntimeWarning,
                 )
 
-    def save_obj(self, obj, model, related_fields):
-        if (
-            obj.object._meta.app_config in self.excluded_apps
-            or type(obj.object) in self.excluded_models
-        ):
-            return False
-        saved = False
-        if router.allow_migrate_model(self.using, obj.object.__class__):
-            saved = True
-            self.models.add(obj.object.__class__)
-            old_pk = obj.object.pk
-            # set the primary key as None
-            obj.object.pk = None
-
-            # set the new primary of foreignkey/onetoone field references
-            for field in related_fields:
-                field_old_pk = getattr(obj.object, field.attname)
-                if field_old_pk and field.null:
-                    self.obj_with_nullable_fk.add(obj)
-                    continue  # avoid setting None value
-                field_new_pk = self.old_new_primary_key_map[field.related_model].get(
-                    field_old_pk
+    def drop_indexes(self, model_classes):
+        """
+        Drop the non-unique, non-primary key indexes of the models' tables and
+        remember their definitions to recreate them once the load is done.
+        """
+        tables = [
+            model._meta.db_table
+            for model in model_classes
+            if model._meta.db_table not in self.dropped_indexes
+        ]
+        if not tables:
+            return
+        connection = connections[self.using]
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT t.relname, i.relname, pg_get_indexdef(i.oid) "
+                    "FROM pg_index x "
+                    "JOIN pg_class i ON i.oid = x.indexrelid "
+                    "JOIN pg_class t ON t.oid = x.indrelid "
+                    "WHERE t.relname = ANY(%s) AND pg_table_is_visible(t.oid) "
+                    "AND NOT x.indisunique AND NOT x.indisprimary "
+                    "AND NOT x.indisexclusion",
+                    [tables],
                 )
-                setattr(obj.object, field.attname, field_new_pk)
-
-            @transaction.atomic
-            def _try_save(obj):
-                try:
-                    obj.save(using=self.using)
-                # psycopg2 raises ValueError if data contains NULL chars.
-                except (DatabaseError, IntegrityError, ValueError) as e:
-                    if isinstance(e, IntegrityError) and self.ignore_conflicting:
-                        # Ensure we save the same old primary key in the
-                        # old_new_primary_key_map dictionary
-                        obj.object.pk = old_pk
-                        return
-                    e.args = (
-                        "Could not load %(app_label)s.%(object_name)s(pk=%(pk)s): %(error_msg)s"
-                        % {
-                            "app_label": obj.object._meta.app_label,
-                            "object_name": obj.object._meta.object_name,
-                            "pk": old_pk,
-                            "error_msg": e,
-                        },
+            else:
+                # unique and primary key indexes are either auto-created,
+                # without sql, or created with CREATE UNIQUE INDEX
+                cursor.execute(
+                    "SELECT tbl_name, name, sql FROM sqlite_master "
+                    "WHERE type = 'index' AND sql IS NOT NULL "
+                    "AND sql NOT LIKE 'CREATE UNIQUE INDEX%%' "
+                    "AND tbl_name IN (%s)" % ", ".join(["%s"] * len(tables)),
+                    tables,
+                )
+            indexes = cursor.fetchall()
+            for table in tables:
+                self.dropped_indexes[table] = []
+            for table, name, definition in indexes:
+                cursor.execute("DROP INDEX %s" % connection.ops.quote_name(name))
+                self.dropped_indexes[table].append((name, definition))
+
+    def recreate_indexes(self):
+        """Recreate the indexes dropped by drop_indexes."""
+        if not any(self.dropped_indexes.values()):
+            return
+        with connections[self.using].cursor() as cursor:
+            for indexes in self.dropped_indexes.values():
+                for _, definition in indexes:
+                    cursor.execute(definition)
+        self.dropped_indexes = {}
+
+    def read_stdin_fixture(self, fixture_file, cmp_fmt):
+        """
+        Read the whole fixture from stdin, which can't be reopened for the
+        second pass, unlike fixture files.
+        """
+        open_method, mode = self.compression_formats[cmp_fmt]
+        fixture = open_method(fixture_file, mode)
+        try:
+            return fixture.read()
+        finally:
+            fixture.close()
+
+    def open_fixture(self, fixture_file, cmp_fmt, content=None):
+        """Open a fixture file, or its already read content if given."""
+        if content is None:
+            open_method, mode = self.compression_formats[cmp_fmt]
+            return open_method(fixture_file, mode)
+        if isinstance(content, bytes):
+            return io.BytesIO(content)
+        return io.StringIO(content)
+
+    def count_fixture_objects(self, fixture_file, ser_fmt, cmp_fmt, content=None):
+        """
+        Count the objects of a fixture by model class. Records of python based
+        formats are counted by their model label, without building instances
+        or looking up natural keys; other formats are fully deserialized.
+        """
+        load_records = RECORD_LOADERS.get(
+            serializers.get_deserializer(ser_fmt).__module__
+        )
+        if load_records is None:
+            return count_objects_by_model(
+                self.deserialize_fixture(fixture_file, ser_fmt, cmp_fmt, content)
+            )
+        fixture = self.open_fixture(fixture_file, cmp_fmt, content)
+        try:
+            return count_records_by_model(load_records(fixture), self.ignore)
+        except DeserializationError:
+            raise
+        except Exception as exc:
+            raise DeserializationError() from exc
+        finally:
+            fixture.close()
+
+    def deserialize_fixture(self, fixture_file, ser_fmt, cmp_fmt, content=None):
+        """
+        Lazily deserialize the objects of a fixture file, or of its already read
+        content if given.
+        """
+        fixture = self.open_fixture(fixture_file, cmp_fmt, content)
+        try:
+            yield from serializers.deserialize(
+                ser_fmt,
+                fixture,
+                using=self.using,
+                ignorenonexistent=self.ignore,
+                handle_forward_references=True,
+            )
+        finally:
+            fixture.close()
+
+    def load_objects(self, objects, model_order, remaining, excluded):
+        """
+        Buffer the deserialized objects per model and insert a model's objects
+        as soon as all the models before it in model_order are inserted.
+        Objects are handled in chunks of consecutive objects of the same model.
+        Return the number of objects processed.
+        """
+        objects_count = 0
+        pending = defaultdict(list)
+        position = 0
+        for model, run in groupby(objects, key=attrgetter("object._meta.model")):
+            for chunk in iter(lambda: list(islice(run, BULK_CREATE_BATCH_SIZE)), []):
+                objects_count += len(chunk)
+                if model in excluded:
+                    continue
+                pending[model].extend(chunk)
+                remaining[model] -= len(chunk)
+                while position < len(model_order):
+                    current = model_order[position]
+                    if remaining[current]:
+                        if len(pending[current]) >= BULK_CREATE_BATCH_SIZE:
+                            self.load_objs(current, pending.pop(current))
+                        break
+                    self.load_objs(current, pending.pop(current, []))
+                    self.inserted_models.add(current)
+                    position += 1
+        return objects_count
+
+    def load_sorted_objects(self, objects):
+        """
+        Insert the deserialized objects in the order they come in, assuming
+        the objects of each model are contiguous and every model comes after the
+        models its non-nullable foreign keys reference. Return the number of
+        objects processed.
+        """
+        objects_count = 0
+        for model, run in groupby(objects, key=attrgetter("object._meta.model")):
+            excluded = self.is_excluded(model)
+            if model in self.inserted_models:
+                # nullable foreign keys to this model were already resolved
+                # against the objects of its previous run
+                raise CommandError(
+                    "%s objects aren't contiguous; the fixture isn't sorted by "
+                    "dependencies, drop --assume-sorted." % model._meta.label
+                )
+            missing = get_dependencies(model) - self.inserted_models - {model}
+            if missing and not excluded:
+                raise CommandError(
+                    "%s references %s which isn't loaded before it; the fixture "
+                    "isn't sorted by dependencies, drop --assume-sorted."
+                    % (
+                        model._meta.label,
+                        ", ".join(sorted(m._meta.label for m in missing)),
                     )
-                    raise
+                )
+            if self.unindex and not excluded:
+                self.drop_indexes([model])
+            for chunk in iter(lambda: list(islice(run, BULK_CREATE_BATCH_SIZE)), []):
+                objects_count += len(chunk)
+                if not excluded:
+                    self.load_objs(model, chunk)
+            if not excluded:
+                self.inserted_models.add(model)
+        return objects_count
+
+    def is_excluded(self, model):
+        return (
+            model in self.excluded_models
+            or model._meta.app_config in self.excluded_apps
+        )
+
+    def load_objs(self, model, objs):
+        """Prepare and insert deserialized objects of a model."""
+        if not objs:
+            return
+        if not router.allow_migrate_model(self.using, model):
+            self.objs_with_deferred_fields.extend(
+                obj for obj in objs if obj.deferred_fields
+            )
+            return
+        related_fields, nullable_related_fields = split_related_fields(model)
+        rewrite_fks = make_fk_rewriter_factory(model)(
+            *(
+                self.old_new_primary_key_map[field.related_model].get
+                for field in related_fields
+            )
+        )
+        instances = [obj.object for obj in objs]
+        old_pks = [instance.pk for instance in instances]
+        rewrite_fks(instances)
+        if nullable_related_fields:
+            for obj in objs:
+                self.rewrite_nullable_fks(obj, nullable_related_fields)
+        self.objs_with_deferred_fields.extend(
+            obj for obj in objs if obj.deferred_fields
+        )
+        self.models.add(model)
+        self.save_objs(model, objs, old_pks)
+        self.loaded_objects_in_fixture += len(objs)
+        if self.show_progress:
+            self.stdout.write(
+                "\rProcessed %i object(s)." % self.loaded_objects_in_fixture,
+                ending="",
+            )
+
+    def update_nullable_fks(self):
+        """
+        Point the nullable foreign keys left unset by rewrite_nullable_fks to the
+        inserted objects, with one bulk UPDATE per model.
+        """
+        model_to_objs = defaultdict(list)
+        model_to_fields = defaultdict(set)
+        for obj, nullable_related_fields in self.obj_with_nullable_fk.items():
+            model = obj.object._meta.model
+            model_to_objs[model].append(obj)
+            values = obj.object.__dict__
+            for field in nullable_related_fields:
+                values[field.attname] = self.old_new_primary_key_map[
+                    field.related_model
+                ].get(values[field.attname])
+                model_to_fields[model].add(field.name)
+
+        for model, objs in model_to_objs.items():
+            try:
+                if pre_save.has_listeners(model) or post_save.has_listeners(model):
+                    # save the objects one by one to send the raw save signals
+                    for obj in objs:
+                        obj.save(using=self.using)
+                    continue
+                model._default_manager.using(self.using).bulk_update(
+                    [obj.object for obj in objs],
+                    sorted(model_to_fields[model]),
+                    batch_size=BULK_CREATE_BATCH_SIZE,
+                )
+            # psycopg2 raises ValueError if data contains NULL chars.
+            except (DatabaseError, IntegrityError, ValueError) as e:
+                e.args = (
+                    "Could not update %(app_label)s.%(object_name)s: %(error_msg)s"
+                    % {
+                        "app_label": model._meta.app_label,
+                        "object_name": model._meta.object_name,
+                        "error_msg": e,
+                    },
+                )
+                raise
 
-            _try_save(obj)
-            self.old_new_primary_key_map[model][old_pk] = obj.object.pk
+    def rewrite_nullable_fks(self, obj, nullable_related_fields):
+        """
+        Point the nullable foreign keys of the object to the newly inserted
+        objects, or defer them if the referenced objects aren't inserted yet.
+        """
+        primary_key_map = self.old_new_primary_key_map
+        # write to __dict__ directly as the field descriptors aren't needed
+        values = obj.object.__dict__
+        for field in nullable_related_fields:
+            attname = field.attname
+            field_old_pk = values[attname]
+            if field_old_pk and field.related_model not in self.inserted_models:
+                # the referenced object isn't inserted yet, set the
+                # reference once all the objects are inserted
+                self.obj_with_nullable_fk[obj].append(field)
+                continue  # avoid setting None value
+            values[attname] = primary_key_map[field.related_model].get(field_old_pk)
+
+    def get_bulk_inserter(self, model):
+        """
+        Return a function inserting many objects of the model at once and
+        setting their new primary keys, or None if it isn't supported.
+        """
+        if model._meta.parents:
+            # bulk inserts don't support multi-table inheritance
+            return None
+        if pre_save.has_listeners(model) or post_save.has_listeners(model):
+            # bulk inserts don't send the signals raw saves send
+            return None
+        connection = connections[self.using]
+        if isinstance(model._meta.pk, models.AutoField):
+            if self.use_copy:
+                return self.copy_objs
+            if connection.vendor == "postgresql":
+                return self.execute_values_objs
+        if not bulk_create_keeps_values(model):
+            return None
+        # Django < 3.0 calls this feature can_return_ids_from_bulk_insert
+        if getattr(
+            connection.features,
+            "can_return_rows_from_bulk_insert",
+            getattr(connection.features, "can_return_ids_from_bulk_insert", False),
+        ):
+            return self.bulk_create_objs
+        return None
+
+    def bulk_create_objs(self, model, objs):
+        model._default_manager.using(self.using).bulk_create(
+            [obj.object for obj in objs], batch_size=BULK_CREATE_BATCH_SIZE
+        )
 
-        if obj.deferred_fields:
-            self.objs_with_deferred_fields.append(obj)
-        return saved
+    def execute_values_objs(self, model, objs):
+        """
+        Insert the objects with multi-row INSERT ... RETURNING queries built by
+        psycopg2's execute_values, bypassing the ORM's per-object work.
+        """
+        from psycopg2.extras import execute_values
+
+        connection = connections[self.using]
+        opts = model._meta
+        fields = [field for field in opts.concrete_fields if not field.primary_key]
+        rows = [
+            tuple(
+                field.get_db_prep_save(obj.object.__dict__[field.attname], connection)
+                for field in fields
+            )
+            for obj in objs
+        ]
+        quote_name = connection.ops.quote_name
+        # a model with only a primary key inserts DEFAULT into it
+        columns = [field.column for field in fields] or [opts.pk.column]
+        sql = "INSERT INTO %s (%s) VALUES %%s RETURNING %s" % (
+            quote_name(opts.db_table),
+            ", ".join(quote_name(column) for column in columns),
+            quote_name(opts.pk.column),
+        )
+        with connection.cursor() as cursor:
+            new_pks = execute_values(
+                cursor.cursor,
+                sql,
+                rows,
+                template=None if fields else "(DEFAULT)",
+                page_size=BULK_CREATE_BATCH_SIZE,
+                fetch=True,
+            )
+        for obj, (new_pk,) in zip(objs, new_pks):
+            obj.object.pk = new_pk
+
+    def copy_objs(self, model, objs):
+        """
+        Stream the objects to PostgreSQL with COPY FROM STDIN. As COPY doesn't
+        return the inserted rows, primary keys are allocated from the table's
+        sequence beforehand.
+        """
+        connection = connections[self.using]
+        opts = model._meta
+        fields = opts.concrete_fields
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+                "FROM generate_series(1, %s)",
+                [opts.db_table, opts.pk.column, len(objs)],
+            )
+            for obj, (pk,) in zip(objs, cursor.fetchall()):
+                obj.object.pk = pk
+
+            buf = io.StringIO()
+            for obj in objs:
+                buf.write(
+                    ",".join(
+                        to_copy_value(
+                            field.get_db_prep_save(
+                                getattr(obj.object, field.attname), connection
+                            )
+                        )
+                        for field in fields
+                    )
+                )
+                buf.write("\n")
+            buf.seek(0)
+            columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+            cursor.copy_expert(
+                "COPY %s (%s) FROM STDIN WITH CSV"
+                % (connection.ops.quote_name(opts.db_table), columns),
+                buf,
+            )
+
+    def save_objs(self, model, objs, old_pks):
+        """
+        Insert the prepared objects of a model and record their new primary keys.
+
+        Objects are inserted in bulk when possible. If the bulk insert fails,
+        e.g. due to a conflicting row or a value COPY can't take, the objects
+        are saved one by one so that conflicting rows can be ignored or
+        reported.
+        """
+        primary_key_map = self.old_new_primary_key_map[model]
+        bulk_insert = self.get_bulk_inserter(model)
+        inserted = False
+        if bulk_insert is not None:
+            try:
+                with transaction.atomic(using=self.using):
+                    bulk_insert(model, objs)
+            # psycopg2 raises ValueError if data contains NULL chars.
+            except (DatabaseError, IntegrityError, ValueError) as e:
+                # discard primary keys set by the rolled back insert
+                for obj in objs:
+                    obj.object.pk = None
+                if self.verbosity >= 2:
+                    if self.show_progress:
+                        self.stdout.write("")  # end the progress indicator line
+                    self.stdout.write(
+                        "Could not insert %d %s object(s) in bulk, saving them "
+                        "one by one: %s" % (len(objs), model._meta.label, e)
+                    )
+            else:
+                inserted = True
+                for obj in objs:
+                    if obj.m2m_data:
+                        for accessor_name, object_list in obj.m2m_data.items():
+                            getattr(obj.object, accessor_name).set(object_list)
+                        obj.m2m_data = None
+
+        if not inserted:
+            for obj, old_pk in zip(objs, old_pks):
+                self.save_obj(obj, old_pk)
+
+        # record the whole batch at once rather than one key at a time
+        primary_key_map.update(zip(old_pks, [obj.object.pk for obj in objs]))
+
+    def save_obj(self, obj, old_pk):
+        try:
+            if self.ignore_conflicting:
+                # a savepoint is required to continue the transaction after
+                # a conflicting row
+                with transaction.atomic(using=self.using):
+                    obj.save(using=self.using)
+            else:
+                obj.save(using=self.using)
+        # psycopg2 raises ValueError if data contains NULL chars.
+        except (DatabaseError, IntegrityError, ValueError) as e:
+            if isinstance(e, IntegrityError) and self.ignore_conflicting:
+                # Ensure we save the same old primary key in the
+                # old_new_primary_key_map dictionary
+                obj.object.pk = old_pk
+                return
+            e.args = (
+                "Could not load %(app_label)s.%(object_name)s(pk=%(pk)s): %(error_msg)s"
+                % {
+                    "app_label": obj.object._meta.app_label,
+                    "object_name": obj.object._meta.object_name,
+                    "pk": old_pk,
+                    "error_msg": e,
+                },
+            )
+            raise
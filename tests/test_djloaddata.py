@@ -1,11 +1,20 @@
+import datetime
 import json
 import tempfile
 from io import StringIO
 
+import django
 import pytest
-from django.core.management import call_command
-from django.db import IntegrityError, transaction
+from django.core.management import CommandError, call_command
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_save, pre_save
 
+from dj_snake.management.commands.djloaddata import (
+    count_records_by_model, make_fk_rewriter_factory, to_copy_value,
+    topological_sort, topological_waves
+)
 from tests.testapp import models
 
 
@@ -150,3 +159,398 @@ def test_djloaddata_command_ignore_conflicting_arguement():
         fixture.seek(0)
         call_command("djloaddata", fixture.name, ignoreconflicting=True)
     assert models.Book.objects.get(name="KR$NA and Karma's Book").author == author
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_bulk_create(django_assert_max_num_queries):
+    """Test djloaddata command inserts objects of a model in batches"""
+    # books are listed before their authors
+    fixture_data = [
+        {
+            "model": "testapp.book",
+            "pk": pk,
+            "fields": {"name": f"Book {pk}", "author": 2501 - pk},
+        }
+        for pk in range(1, 2501)
+    ] + [
+        {"model": "testapp.author", "pk": pk, "fields": {"name": f"Author {pk}"}}
+        for pk in range(1, 2501)
+    ]
+    models.Author.objects.create(name="Existing author")
+
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(json.dumps(fixture_data).encode("utf-8"))
+        fixture.seek(0)
+        if getattr(connection.features, "can_return_rows_from_bulk_insert", False):
+            with django_assert_max_num_queries(50):
+                call_command("djloaddata", fixture.name)
+        else:
+            # objects are saved one by one without bulk insert support
+            call_command("djloaddata", fixture.name)
+
+    assert models.Author.objects.count() == 2501
+    assert models.Book.objects.count() == 2500
+    assert models.Book.objects.get(name="Book 1").author.name == "Author 2500"
+    assert models.Book.objects.get(name="Book 2500").author.name == "Author 1"
+
+
+def test_to_copy_value():
+    assert to_copy_value(None) == ""
+    assert to_copy_value("") == '""'
+    assert to_copy_value('say "hi", bye') == '"say ""hi"", bye"'
+    assert to_copy_value(True) == '"t"'
+    assert to_copy_value(42) == '"42"'
+    assert to_copy_value(b"\x01\xff") == '"\\x01ff"'
+    assert to_copy_value(["a", None, 'b"c']) == '"{""a"",NULL,""b\\""c""}"'
+
+    class Json:
+        # mimics psycopg2.extras.Json with a custom encoder
+        def __init__(self, adapted):
+            self.adapted = adapted
+
+        def dumps(self, obj):
+            return json.dumps(obj, cls=DjangoJSONEncoder)
+
+    value = Json({"at": datetime.date(2022, 3, 25)})
+    assert to_copy_value(value) == '"{""at"": ""2022-03-25""}"'
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_copy_requires_postgresql():
+    with pytest.raises(CommandError, match="only supported on PostgreSQL"):
+        call_command("djloaddata", "fixture", copy=True)
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_reports_bulk_insert_fallback():
+    """Test djloaddata command reports batches saved one by one at verbosity 2"""
+    if not getattr(connection.features, "can_return_rows_from_bulk_insert", False):
+        pytest.skip("objects aren't inserted in bulk on this database")
+    models.Author.objects.create(name="KR$NA")
+    fixture_data = [
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "KR$NA"}},
+        {"model": "testapp.author", "pk": 2, "fields": {"name": "Karma"}},
+    ]
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(json.dumps(fixture_data).encode("utf-8"))
+        fixture.seek(0)
+        out = StringIO()
+        call_command(
+            "djloaddata", fixture.name, ignoreconflicting=True, verbosity=2, stdout=out
+        )
+
+    assert (
+        "Could not insert 2 testapp.Author object(s) in bulk, saving them one by one"
+        in out.getvalue()
+    )
+    assert models.Author.objects.filter(name="Karma").exists()
+
+
+def test_count_records_by_model():
+    records = [
+        {"model": "testapp.author", "pk": 1},
+        {"model": "testapp.Author"},
+        {"model": "testapp.book", "pk": 1},
+        {"model": "testapp.nonexistent", "pk": 1},
+    ]
+    assert count_records_by_model(records, ignorenonexistent=True) == {
+        models.Author: 2,
+        models.Book: 1,
+    }
+    with pytest.raises(DeserializationError, match="testapp.nonexistent"):
+        count_records_by_model(records)
+
+
+def test_topological_sort():
+    graph = {"a": set(), "b": {"a"}, "c": {"a", "b"}, "d": set()}
+    order = list(topological_sort(graph))
+    assert sorted(order) == ["a", "b", "c", "d"]
+    for node, dependencies in graph.items():
+        assert all(order.index(dep) < order.index(node) for dep in dependencies)
+
+    with pytest.raises(ValueError, match="Cyclic dependency"):
+        list(topological_sort({"a": {"b"}, "b": {"a"}, "c": set()}))
+
+
+def test_topological_waves():
+    graph = {"a": set(), "b": {"a"}, "c": {"a", "b"}, "d": set(), "e": {"d"}}
+    waves = [sorted(wave) for wave in topological_waves(graph)]
+    assert waves == [["a", "d"], ["b", "e"], ["c"]]
+
+    assert list(topological_waves({"a": set(), "b": set()})) == [["a", "b"]]
+    assert list(topological_waves({})) == []
+    with pytest.raises(ValueError, match="Cyclic dependency"):
+        list(topological_waves({"a": {"a"}}))
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_unindex():
+    """Test djloaddata command recreates the indexes it drops with --unindex"""
+    fixture_data = [
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "KR$NA"}},
+        {
+            "model": "testapp.book",
+            "pk": 1,
+            "fields": {"name": "KR$NA's Book", "author": 1},
+        },
+    ]
+
+    def get_indexes():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+                "ORDER BY name"
+            )
+            return cursor.fetchall()
+
+    indexes = get_indexes()
+    assert any("author_id" in (sql or "") for _, sql in indexes)
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(json.dumps(fixture_data).encode("utf-8"))
+        fixture.seek(0)
+        call_command("djloaddata", fixture.name, unindex=True)
+
+    assert get_indexes() == indexes
+    assert models.Book.objects.get(name="KR$NA's Book").author.name == "KR$NA"
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_exclude():
+    """Test djloaddata command skips the objects of excluded models"""
+    fixture_data = [
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "KR$NA"}},
+        {
+            "model": "testapp.book",
+            "pk": 1,
+            "fields": {"name": "KR$NA's Book", "author": 1},
+        },
+    ]
+    out = StringIO()
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(json.dumps(fixture_data).encode("utf-8"))
+        fixture.seek(0)
+        call_command("djloaddata", fixture.name, exclude=["testapp.book"], stdout=out)
+
+    assert models.Author.objects.filter(name="KR$NA").exists()
+    assert not models.Book.objects.exists()
+    assert "Installed 1 object(s) (of 2) from 1 fixture(s)" in out.getvalue()
+
+
+def test_make_fk_rewriter_factory():
+    rewrite = make_fk_rewriter_factory(models.Book)({1: 10}.get)
+    book = models.Book(pk=5, name="Book", author_id=1)
+    rewrite([book])
+    assert book.pk is None
+    assert book.author_id == 10
+
+    # models without non-nullable foreign keys get a no-op rewriter
+    author = models.Author(pk=5, name="Author", favourite_publisher_id=1)
+    make_fk_rewriter_factory(models.Author)()([author])
+    assert author.pk is None
+    assert author.favourite_publisher_id == 1
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_assume_sorted():
+    """Test djloaddata command loads dumpdata output in a single pass"""
+    author_drake = models.Author.objects.create(name="Drake")
+    book = models.Book.objects.create(name="Drake's Book", author=author_drake)
+    publisher = models.Publisher.objects.create(name="OVO", favourite_book=book)
+    author_drake.favourite_publisher = publisher
+    author_drake.save()
+    out = StringIO()
+    call_command("dumpdata", "testapp", stdout=out)
+    models.Author.objects.update(name="Daft Punk")
+    models.Book.objects.update(name="Punk's Book")
+    models.Publisher.objects.update(name="Columbia")
+
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(out.getvalue().encode("utf-8"))
+        fixture.seek(0)
+        call_command("djloaddata", fixture.name, assume_sorted=True)
+
+    drake = models.Author.objects.get(name="Drake")
+    drake_book = models.Book.objects.get(name="Drake's Book")
+    ovo = models.Publisher.objects.get(name="OVO")
+    assert drake.pk != author_drake.pk
+    assert drake_book.author == drake
+    assert ovo.favourite_book == drake_book
+    assert drake.favourite_publisher == ovo
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_assume_sorted_unsorted_fixture():
+    """Test djloaddata command rejects a fixture not sorted by dependencies
+    with --assume-sorted"""
+    fixture_data = [
+        {"model": "testapp.book", "pk": 1, "fields": {"name": "Book", "author": 1}},
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "Drake"}},
+    ]
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(json.dumps(fixture_data).encode("utf-8"))
+        fixture.seek(0)
+        with pytest.raises(CommandError, match="drop --assume-sorted"):
+            call_command("djloaddata", fixture.name, assume_sorted=True)
+        call_command("djloaddata", fixture.name)
+
+    assert models.Book.objects.get().author == models.Author.objects.get()
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_assume_sorted_non_contiguous_model():
+    """Test djloaddata command rejects a fixture whose objects of a model aren't
+    contiguous with --assume-sorted"""
+    fixture_data = [
+        {"model": "testapp.person", "pk": 1, "fields": {"name": "Drake"}},
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "Daft Punk"}},
+        {"model": "testapp.person", "pk": 2, "fields": {"name": "Ye", "friend": 3}},
+        {"model": "testapp.person", "pk": 3, "fields": {"name": "Future", "friend": 1}},
+    ]
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(json.dumps(fixture_data).encode("utf-8"))
+        fixture.seek(0)
+        with pytest.raises(CommandError, match="drop --assume-sorted"):
+            call_command("djloaddata", fixture.name, assume_sorted=True)
+        call_command("djloaddata", fixture.name)
+
+    drake = models.Person.objects.get(name="Drake")
+    future = models.Person.objects.get(name="Future")
+    assert models.Person.objects.get(name="Ye").friend == future
+    assert future.friend == drake
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_keeps_pre_save_values():
+    """Test djloaddata command saves the fixture values of fields setting their
+    own value on save"""
+    fixture_data = [
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "KR$NA"}},
+        {
+            "model": "testapp.book",
+            "pk": 1,
+            "fields": {"name": "KR$NA's Book", "author": 1},
+        },
+        {
+            "model": "testapp.review",
+            "pk": 1,
+            "fields": {
+                "name": "Five stars",
+                "book": 1,
+                "created_at": "2022-03-25T10:00:00Z",
+            },
+        },
+        {"model": "testapp.tag", "pk": 1, "fields": {"name": "Poetry", "code": "ABC"}},
+    ]
+    with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+        fixture.write(json.dumps(fixture_data).encode("utf-8"))
+        fixture.seek(0)
+        call_command("djloaddata", fixture.name)
+
+    review = models.Review.objects.get(name="Five stars")
+    assert review.book.name == "KR$NA's Book"
+    assert review.created_at.isoformat() == "2022-03-25T10:00:00+00:00"
+    assert models.Tag.objects.get(name="Poetry").code == "ABC"
+
+
+@pytest.mark.django_db
+def test_djloaddata_command_sends_raw_save_signals():
+    """Test djloaddata command sends pre_save and post_save signals"""
+    fixture_data = [
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "KR$NA"}},
+        {
+            "model": "testapp.book",
+            "pk": 1,
+            "fields": {"name": "KR$NA's Book", "author": 1},
+        },
+    ]
+    fixture_data[0]["fields"]["favourite_publisher"] = 1
+    fixture_data.append(
+        {
+            "model": "testapp.publisher",
+            "pk": 1,
+            "fields": {"name": "Kalamkaar Youtube", "favourite_book": 1},
+        }
+    )
+    received = []
+
+    def receiver(signal, sender, raw, **kwargs):
+        received.append((signal, sender.__name__, raw))
+
+    pre_save.connect(receiver)
+    post_save.connect(receiver)
+    try:
+        with tempfile.NamedTemporaryFile(suffix=".json") as fixture:
+            fixture.write(json.dumps(fixture_data).encode("utf-8"))
+            fixture.seek(0)
+            call_command("djloaddata", fixture.name)
+    finally:
+        pre_save.disconnect(receiver)
+        post_save.disconnect(receiver)
+
+    assert received == [
+        (pre_save, "Author", True),
+        (post_save, "Author", True),
+        (pre_save, "Book", True),
+        (post_save, "Book", True),
+        (pre_save, "Publisher", True),
+        (post_save, "Publisher", True),
+        # second save setting the author's favourite publisher
+        (pre_save, "Author", True),
+        (post_save, "Author", True),
+    ]
+    author = models.Author.objects.get(name="KR$NA")
+    assert author.favourite_publisher.name == "Kalamkaar Youtube"
+
+
+@pytest.mark.skipif(django.VERSION < (3, 0), reason="loaddata reads stdin since 3.0")
+@pytest.mark.django_db
+@pytest.mark.parametrize("assume_sorted", [False, True])
+def test_djloaddata_command_stdin(monkeypatch, assume_sorted):
+    """Test djloaddata command loads a fixture from stdin"""
+    fixture_data = [
+        {"model": "testapp.author", "pk": 1, "fields": {"name": "KR$NA"}},
+        {
+            "model": "testapp.book",
+            "pk": 1,
+            "fields": {"name": "KR$NA's Book", "author": 1},
+        },
+    ]
+    monkeypatch.setattr("sys.stdin", StringIO(json.dumps(fixture_data)))
+    call_command("djloaddata", "-", format="json", assume_sorted=assume_sorted)
+
+    author = models.Author.objects.get(name="KR$NA")
+    assert models.Book.objects.get(name="KR$NA's Book").author == author
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "ser_fmt",
+    [
+        "json",
+        pytest.param(
+            "jsonl",
+            marks=pytest.mark.skipif(
+                django.VERSION < (3, 2), reason="jsonl is supported since 3.2"
+            ),
+        ),
+        "yaml",
+        "xml",
+    ],
+)
+def test_djloaddata_command_formats(ser_fmt):
+    """Test djloaddata command loads fixtures of every serialization format"""
+    author_drake = models.Author.objects.create(name="Drake")
+    models.Book.objects.create(name="Drake's Book", author=author_drake)
+    out = StringIO()
+    call_command("dumpdata", "testapp", format=ser_fmt, stdout=out)
+    models.Author.objects.update(name="Daft Punk")
+    models.Book.objects.update(name="Punk's Book")
+
+    with tempfile.NamedTemporaryFile(suffix="." + ser_fmt) as fixture:
+        fixture.write(out.getvalue().encode("utf-8"))
+        fixture.seek(0)
+        call_command("djloaddata", fixture.name)
+
+    drake = models.Author.objects.get(name="Drake")
+    assert drake.pk != author_drake.pk
+    assert models.Book.objects.get(name="Drake's Book").author == drake
@@ -27,3 +27,19 @@ class Publisher(Base):
 
 class Person(Base):
     friend = models.ForeignKey("self", null=True, on_delete=models.CASCADE)
+
+
+class LowercaseCharField(models.CharField):
+    def pre_save(self, model_instance, add):
+        value = super().pre_save(model_instance, add).lower()
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class Review(Base):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Tag(Base):
+    code = LowercaseCharField(max_length=16)